@@ -1,8 +1,9 @@
 import json
 import os
 import random
-from datetime import datetime
+import time
 
+import numpy as np
 from textual.app import App, ComposeResult
 from textual.containers import Grid, HorizontalGroup, VerticalGroup, VerticalScroll
 from textual.reactive import reactive
@@ -22,8 +23,21 @@ from textual.widgets import (
 
 from src.mock_obd import mock_obd_data
 
-METRICS_INTERVAL = int(os.getenv("DASHBOARD_METRICS_INTERVAL", 1))
-QUERY_INTERVAL = int(os.getenv("DASHBOARD_QUERY_INTERVAL", 5))
+METRICS_INTERVAL = float(os.getenv("DASHBOARD_METRICS_INTERVAL", 1))
+QUERY_INTERVAL = float(os.getenv("DASHBOARD_QUERY_INTERVAL", 5))
+
+_RNG = np.random.default_rng(73)
+
+METRICS = (
+    "rpm",
+    "speed",
+    "throttle_position",
+    "distance",
+    "runtime",
+    "coolant_temp",
+    "intake_temp",
+    "oil_temp",
+)
 
 
 # screens
@@ -188,34 +202,28 @@ class MainApp(App):
         )
 
     def on_mount(self) -> None:
+        self._digits = {
+            metric: self.query_one(f"#{metric}", Digits) for metric in METRICS
+        }
+
         self.metrics_timer = self.set_interval(METRICS_INTERVAL, self.refresh_metrics)
         self.query_timer = self.set_interval(QUERY_INTERVAL, self.refresh_query)
 
     def refresh_metrics(self) -> None:
         sample_data = mock_obd_data()
 
-        self.query_one("#rpm", Digits).update(f"{sample_data['rpm']}")
-        self.query_one("#speed", Digits).update(f"{sample_data['speed']}")
-        self.query_one("#throttle_position", Digits).update(
-            f"{sample_data['throttle_position']}"
-        )
-        self.query_one("#distance", Digits).update(f"{sample_data['distance']}")
-        self.query_one("#runtime", Digits).update(f"{sample_data['runtime']}")
-
-        self.query_one("#coolant_temp", Digits).update(f"{sample_data['coolant_temp']}")
-        self.query_one("#intake_temp", Digits).update(f"{sample_data['intake_temp']}")
-        self.query_one("#oil_temp", Digits).update(f"{sample_data['oil_temp']}")
+        with self.batch_update():
+            for metric, digits in self._digits.items():
+                digits.update(str(sample_data[metric]))
 
     def refresh_query(self) -> None:
-        random.seed(73)
-
-        self.query_one("#speed-graph", Sparkline).data = [
-            random.expovariate(1 / 3) for _ in range(1000)
-        ]
+        self.query_one("#speed-graph", Sparkline).data = _RNG.exponential(
+            3.0, 1000
+        ).tolist()
 
         message_display = self.query_one(MessageDisplay)
 
-        message_display.message = f"{datetime.now()}"
+        message_display.message = time.strftime("%Y-%m-%d %H:%M:%S")
 
     def action_request_quit(self) -> None:
         self.push_screen(QuitScreen())
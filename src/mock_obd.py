@@ -1,11 +1,13 @@
 import json
 import os
 import random
+import sys
 import time
 from datetime import datetime
 
+import numpy as np
 from dotenv import load_dotenv
-from influxdb_client import Point
+from influxdb_client import Point, WritePrecision
 from loguru import logger
 
 from src.utils import DB
@@ -15,78 +17,192 @@ load_dotenv()
 VEHICLE_ID = os.getenv("VEHICLE_ID", "vehicle_001")
 
 
+# Common DTC codes for check engine light scenarios, with severity precomputed
+DTC_POOL = tuple(
+    {
+        "code": code,
+        "description": description,
+        "severity": "high" if "misfire" in description.lower() else "medium",
+    }
+    for code, description in (
+        ("P0300", "Random/Multiple Cylinder Misfire Detected"),
+        ("P0420", "Catalyst System Efficiency Below Threshold"),
+        ("P0171", "System Too Lean (Bank 1)"),
+        ("P0128", "Coolant Thermostat Temperature Below Regulating Temperature"),
+        ("P0442", "EVAP System Leak Detected (small leak)"),
+        ("P0455", "EVAP System Leak Detected (large leak)"),
+        ("P0301", "Cylinder 1 Misfire Detected"),
+        ("P0401", "EGR System Flow Insufficient"),
+        ("P0507", "Idle Control System RPM Higher Than Expected"),
+        ("P0113", "Intake Air Temperature Sensor Circuit High"),
+    )
+)
+
+# Sensor readings stored as fields on each obd_readings point
+FIELD_KEYS = (
+    "rpm",
+    "speed",
+    "throttle_position",
+    "engine_load",
+    "coolant_temp",
+    "intake_temp",
+    "oil_temp",
+    "fuel_level",
+    "fuel_pressure",
+    "fuel_rate",
+    "maf",
+    "intake_pressure",
+    "battery_voltage",
+    "ambient_temp",
+    "barometric_pressure",
+    "distance",
+    "runtime",
+    "dtc_count",
+)
+
+
 def mock_obd_data():
     """
     Mock OBD-II data for testing InfluxDB storage.
     Returns a dictionary with common vehicle parameters including DTCs.
     """
 
-    # Common DTC codes for check engine light scenarios
-    dtc_pool = [
-        {"code": "P0300", "description": "Random/Multiple Cylinder Misfire Detected"},
-        {"code": "P0420", "description": "Catalyst System Efficiency Below Threshold"},
-        {"code": "P0171", "description": "System Too Lean (Bank 1)"},
-        {
-            "code": "P0128",
-            "description": "Coolant Thermostat Temperature Below Regulating Temperature",
-        },
-        {"code": "P0442", "description": "EVAP System Leak Detected (small leak)"},
-        {"code": "P0455", "description": "EVAP System Leak Detected (large leak)"},
-        {"code": "P0301", "description": "Cylinder 1 Misfire Detected"},
-        {"code": "P0401", "description": "EGR System Flow Insufficient"},
-        {
-            "code": "P0507",
-            "description": "Idle Control System RPM Higher Than Expected",
-        },
-        {"code": "P0113", "description": "Intake Air Temperature Sensor Circuit High"},
-    ]
+    rnd = random.random
+    rint = random.randint
+    unif = random.uniform
 
     # Decide if there are any DTCs present
-    has_dtc = random.choice([True, False, False])  # 33% chance of having DTCs
-    dtc_count = random.randint(1, 3) if has_dtc else 0
-    active_dtcs = random.sample(dtc_pool, dtc_count) if dtc_count > 0 else []
+    has_dtc = rnd() < 1 / 3  # 33% chance of having DTCs
+    dtc_count = rint(1, 3) if has_dtc else 0
+    active_dtcs = random.sample(DTC_POOL, dtc_count) if dtc_count > 0 else []
+
+    now_ns = time.time_ns()
+    now = now_ns / 1e9
 
     # Simulate realistic ranges for various OBD parameters
     mock_data = {
         # Engine parameters
-        "rpm": random.randint(700, 3500),  # Engine RPM
-        "speed": random.randint(0, 120),  # Vehicle speed (km/h or mph)
-        "throttle_position": round(random.uniform(0, 100), 2),  # Throttle %
-        "engine_load": round(random.uniform(10, 90), 2),  # Engine load %
+        "rpm": rint(700, 3500),  # Engine RPM
+        "speed": rint(0, 120),  # Vehicle speed (km/h or mph)
+        "throttle_position": round(unif(0, 100), 2),  # Throttle %
+        "engine_load": round(unif(10, 90), 2),  # Engine load %
         # Temperature sensors
-        "coolant_temp": random.randint(75, 105),  # Coolant temperature (°C)
-        "intake_temp": random.randint(20, 60),  # Intake air temperature (°C)
-        "oil_temp": random.randint(80, 110),  # Oil temperature (°C)
+        "coolant_temp": rint(75, 105),  # Coolant temperature (°C)
+        "intake_temp": rint(20, 60),  # Intake air temperature (°C)
+        "oil_temp": rint(80, 110),  # Oil temperature (°C)
         # Fuel system
-        "fuel_level": round(random.uniform(10, 95), 2),  # Fuel level %
-        "fuel_pressure": round(random.uniform(200, 400), 2),  # Fuel pressure (kPa)
-        "fuel_rate": round(random.uniform(0.5, 15), 2),  # Fuel consumption rate (L/h)
+        "fuel_level": round(unif(10, 95), 2),  # Fuel level %
+        "fuel_pressure": round(unif(200, 400), 2),  # Fuel pressure (kPa)
+        "fuel_rate": round(unif(0.5, 15), 2),  # Fuel consumption rate (L/h)
         # Air flow
-        "maf": round(random.uniform(2, 25), 2),  # Mass air flow (grams/sec)
-        "intake_pressure": round(
-            random.uniform(30, 100), 2
-        ),  # Intake manifold pressure (kPa)
+        "maf": round(unif(2, 25), 2),  # Mass air flow (grams/sec)
+        "intake_pressure": round(unif(30, 100), 2),  # Intake manifold pressure (kPa)
         # Other sensors
-        "battery_voltage": round(random.uniform(12.5, 14.5), 2),  # Battery voltage
-        "ambient_temp": random.randint(15, 35),  # Ambient air temperature (°C)
-        "barometric_pressure": round(
-            random.uniform(95, 105), 2
-        ),  # Barometric pressure (kPa)
+        "battery_voltage": round(unif(12.5, 14.5), 2),  # Battery voltage
+        "ambient_temp": rint(15, 35),  # Ambient air temperature (°C)
+        "barometric_pressure": round(unif(95, 105), 2),  # Barometric pressure (kPa)
         # Calculated values
-        "distance": round(random.uniform(0, 50000), 1),  # Distance traveled (km)
-        "runtime": random.randint(0, 10000),  # Engine runtime (seconds)
+        "distance": round(unif(0, 50000), 1),  # Distance traveled (km)
+        "runtime": rint(0, 10000),  # Engine runtime (seconds)
         # Diagnostic information
         "mil_status": has_dtc,  # Check engine light (MIL) - Malfunction Indicator Lamp
         "dtc_count": dtc_count,  # Diagnostic trouble codes count
         "dtcs": active_dtcs,  # List of active DTCs with codes and descriptions
         # Timestamp
-        "timestamp": datetime.now().isoformat(),
-        "unix_timestamp": int(time.time()),
+        "timestamp": datetime.fromtimestamp(now).isoformat(),
+        "unix_timestamp": int(now),
+        "unix_timestamp_ns": now_ns,  # Write time, distinct for sub-second readings
     }
 
     return mock_data
 
 
+def mock_obd_batch(count, interval=1, seed=None):
+    """
+    Generate a batch of mock OBD-II readings in one vectorized pass.
+
+    Useful for backfills and load tests where calling mock_obd_data() in a
+    loop is too slow. Readings are spaced `interval` seconds apart, ending now.
+
+    Args:
+        count: Number of readings to generate
+        interval: Time between readings (seconds)
+        seed: Optional seed for reproducible sensor values and DTCs
+
+    Returns:
+        Dictionary mapping each parameter to a NumPy array of `count` values
+    """
+
+    rng = np.random.default_rng(seed)
+    rint = rng.integers
+    unif = rng.uniform
+
+    has_dtc = rng.random(count) < 1 / 3
+    dtc_count = np.where(has_dtc, rint(1, 4, count), 0)
+    offsets_ns = (interval * 1e9 * np.arange(count - 1, -1, -1)).astype(np.int64)
+    unix_timestamp_ns = time.time_ns() - offsets_ns
+
+    # A random ordering of DTC_POOL per reading; the first dtc_count are active
+    dtc_order = rng.permuted(np.tile(np.arange(len(DTC_POOL)), (count, 1)), axis=1)
+
+    return {
+        # Engine parameters
+        "rpm": rint(700, 3501, count),
+        "speed": rint(0, 121, count),
+        "throttle_position": unif(0, 100, count).round(2),
+        "engine_load": unif(10, 90, count).round(2),
+        # Temperature sensors
+        "coolant_temp": rint(75, 106, count),
+        "intake_temp": rint(20, 61, count),
+        "oil_temp": rint(80, 111, count),
+        # Fuel system
+        "fuel_level": unif(10, 95, count).round(2),
+        "fuel_pressure": unif(200, 400, count).round(2),
+        "fuel_rate": unif(0.5, 15, count).round(2),
+        # Air flow
+        "maf": unif(2, 25, count).round(2),
+        "intake_pressure": unif(30, 100, count).round(2),
+        # Other sensors
+        "battery_voltage": unif(12.5, 14.5, count).round(2),
+        "ambient_temp": rint(15, 36, count),
+        "barometric_pressure": unif(95, 105, count).round(2),
+        # Calculated values
+        "distance": unif(0, 50000, count).round(1),
+        "runtime": rint(0, 10001, count),
+        # Diagnostic information
+        "mil_status": has_dtc,
+        "dtc_count": dtc_count,
+        "dtc_order": dtc_order,
+        # Timestamp
+        "unix_timestamp": unix_timestamp_ns // 1_000_000_000,
+        "unix_timestamp_ns": unix_timestamp_ns,
+    }
+
+
+def mock_obd_batch_records(batch):
+    """
+    Convert a batch from mock_obd_batch() into mock_obd_data()-style dicts.
+
+    Args:
+        batch: Dictionary of NumPy arrays returned by mock_obd_batch()
+
+    Returns:
+        List of dictionaries of mock OBD data
+    """
+
+    columns = {key: values.tolist() for key, values in batch.items()}
+    records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    for record in records:
+        dtc_order = record.pop("dtc_order")
+        record["dtcs"] = [DTC_POOL[i] for i in dtc_order[: record["dtc_count"]]]
+        record["timestamp"] = datetime.fromtimestamp(
+            record["unix_timestamp_ns"] / 1e9
+        ).isoformat()
+
+    return records
+
+
 def mock_obd_stream(duration_seconds=10, interval=1):
     """
     Generate a stream of mock OBD data for a specified duration.
@@ -113,52 +229,76 @@ def store_to_db(db, obd_reading):
         obd_reading: Dictionary containing OBD data
     """
 
-    # Create point for raw sensor readings
-    point = (
-        Point("obd_readings")
-        .tag("vehicle_id", VEHICLE_ID)
-        .tag("mil_status", str(obd_reading["mil_status"]))
-        .field("rpm", obd_reading["rpm"])
-        .field("speed", obd_reading["speed"])
-        .field("throttle_position", obd_reading["throttle_position"])
-        .field("engine_load", obd_reading["engine_load"])
-        .field("coolant_temp", obd_reading["coolant_temp"])
-        .field("intake_temp", obd_reading["intake_temp"])
-        .field("oil_temp", obd_reading["oil_temp"])
-        .field("fuel_level", obd_reading["fuel_level"])
-        .field("fuel_pressure", obd_reading["fuel_pressure"])
-        .field("fuel_rate", obd_reading["fuel_rate"])
-        .field("maf", obd_reading["maf"])
-        .field("intake_pressure", obd_reading["intake_pressure"])
-        .field("battery_voltage", obd_reading["battery_voltage"])
-        .field("ambient_temp", obd_reading["ambient_temp"])
-        .field("barometric_pressure", obd_reading["barometric_pressure"])
-        .field("distance", obd_reading["distance"])
-        .field("runtime", obd_reading["runtime"])
-        .field("dtc_count", obd_reading["dtc_count"])
-    )
+    # Nanosecond time, so readings within the same second don't overwrite each other
+    timestamp = obd_reading["unix_timestamp_ns"]
 
-    db.store_data(point)
+    # Create point for raw sensor readings
+    points = [
+        Point.from_dict(
+            {
+                "measurement": "obd_readings",
+                "tags": {
+                    "vehicle_id": VEHICLE_ID,
+                    "mil_status": str(obd_reading["mil_status"]),
+                },
+                "fields": {key: obd_reading[key] for key in FIELD_KEYS},
+                "time": timestamp,
+            },
+            write_precision=WritePrecision.NS,
+        )
+    ]
 
     # If there are DTCs, store them as separate events for easier querying
-    if obd_reading["dtc_count"] > 0:
-        for dtc in obd_reading["dtcs"]:
-            dtc_point = (
-                Point("obd_dtc_events")
-                .tag("vehicle_id", VEHICLE_ID)
-                .tag("dtc_code", dtc["code"])
-                .tag(
-                    "severity",
-                    "high" if "misfire" in dtc["description"].lower() else "medium",
-                )
-                .field("description", dtc["description"])
-                .field("rpm", obd_reading["rpm"])
-                .field("speed", obd_reading["speed"])
-                .field("coolant_temp", obd_reading["coolant_temp"])
-                .field("engine_load", obd_reading["engine_load"])
+    for dtc in obd_reading["dtcs"]:
+        points.append(
+            Point.from_dict(
+                {
+                    "measurement": "obd_dtc_events",
+                    "tags": {
+                        "vehicle_id": VEHICLE_ID,
+                        "dtc_code": dtc["code"],
+                        "severity": dtc["severity"],
+                    },
+                    "fields": {
+                        "description": dtc["description"],
+                        "rpm": obd_reading["rpm"],
+                        "speed": obd_reading["speed"],
+                        "coolant_temp": obd_reading["coolant_temp"],
+                        "engine_load": obd_reading["engine_load"],
+                    },
+                    "time": timestamp,
+                },
+                write_precision=WritePrecision.NS,
             )
+        )
+
+    # Write the reading and its DTC events in a single request
+    db.store_data(points)
 
-            db.store_data(dtc_point)
+
+def backfill_obd_data(count, interval=2, seed=None):
+    """
+    Store a batch of past mock OBD readings, ending now, to InfluxDB.
+
+    Args:
+        count: Number of readings to store
+        interval: Time between readings (seconds)
+        seed: Optional seed for reproducible readings
+    """
+
+    records = mock_obd_batch_records(mock_obd_batch(count, interval, seed))
+
+    with DB() as db:
+        for obd_reading in records:
+            store_to_db(db, obd_reading)
+
+    if db.failed_batches:
+        logger.error(
+            f"Backfilled {len(records)} readings, "
+            f"{db.failed_batches} write batches failed"
+        )
+    else:
+        logger.success(f"Backfilled {len(records)} readings to InfluxDB")
 
 
 def collect_and_store_obd_data(duration_seconds=60, interval=2):
@@ -185,12 +325,8 @@ def collect_and_store_obd_data(duration_seconds=60, interval=2):
             ):
                 reading_count += 1
 
-                # Store to DB
-                try:
-                    store_to_db(db, obd_reading)
-                except Exception as e:
-                    logger.error(f"DB write error: {e}")
-                    continue
+                # Queue for the DB's batching writer; failures are logged by DB
+                store_to_db(db, obd_reading)
 
                 # Log summary
                 dtc_info = (
@@ -217,8 +353,15 @@ def collect_and_store_obd_data(duration_seconds=60, interval=2):
                     for dtc in obd_reading["dtcs"]:
                         logger.warning(f"      └─ {dtc['code']}: {dtc['description']}")
 
+        # The writer has flushed on exit, so the failure count is final
         logger.info("=" * 70)
-        logger.success(f"Completed: {reading_count} readings stored to InfluxDB")
+        if db.failed_batches:
+            logger.error(
+                f"Completed: {reading_count} readings collected, "
+                f"{db.failed_batches} write batches failed"
+            )
+        else:
+            logger.success(f"Completed: {reading_count} readings stored to InfluxDB")
 
     except KeyboardInterrupt:
         logger.warning("Interrupted by user")
@@ -230,17 +373,24 @@ if __name__ == "__main__":
     # Configure logger
     logger.remove()
     logger.add(
-        lambda msg: print(msg, end=""),
+        sys.stdout,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
         level="INFO",
+        enqueue=True,  # write records from a background thread
     )
 
     # Example: Single mock reading to see the data structure
     logger.info("Sample mock OBD reading:")
     logger.info("=" * 70)
     sample_data = mock_obd_data()
+    logger.complete()  # let queued log lines reach stdout before printing directly
     print(json.dumps(sample_data, indent=2))
     logger.info("=" * 70)
 
+    # Optionally fill in history first, so trend queries have data to work with
+    backfill = int(os.getenv("OBD_BACKFILL", 0))
+    if backfill:
+        backfill_obd_data(backfill, interval=float(os.getenv("OBD_INTERVAL", 2)))
+
     # Start collecting and storing to InfluxDB
     collect_and_store_obd_data()
@@ -1,6 +1,6 @@
-import json
 import os
 
+import orjson
 from llama_index.core import Settings, VectorStoreIndex
 from llama_index.core.schema import Document
 from llama_index.embeddings.ollama import OllamaEmbedding
@@ -8,9 +8,9 @@ from llama_index.llms.ollama import Ollama
 from loguru import logger
 
 # from utils import LLM
-from utils import DB
+from utils import DB, NORMAL_OPERATING_RANGES
 
-SYSTEM_PROMPT = """
+SYSTEM_PROMPT = f"""
 You are an expert automotive diagnostic assistant analyzing OBD-II (On-Board Diagnostics) data.
 
 ## Your Task
@@ -26,13 +26,7 @@ The data contains time-series readings with these parameters:
 - **Vehicle motion**: speed (km/h), distance (km)
 
 ## Normal Operating Ranges
-- Engine RPM: 600-900 idle, 1500-3000 driving
-- Coolant temp: 85-105°C (warning if >105°C)
-- Oil temp: 90-110°C (warning if >120°C)
-- Battery voltage: 12.6-14.4V (warning if <12V or >15V)
-- Fuel pressure: 250-350 kPa
-- Throttle position: 0% idle, varies with acceleration
-
+{NORMAL_OPERATING_RANGES}
 ## Analysis Structure
 Provide your analysis in the following format:
 
@@ -71,6 +65,7 @@ Provide your analysis in the following format:
 """
 
 VEHICLE_ID = os.getenv("VEHICLE_ID", "vehicle_001")
+RECORDS_PER_DOCUMENT = 10
 
 Settings.llm = Ollama(
     model=os.getenv("LLM_API_MODEL", "llama3.2:latest"),
@@ -94,7 +89,11 @@ def main():
 
     logger.info(f"Retrieved {len(obd_data)} records")
 
-    docs = [Document(text=json.dumps(record, indent=2)) for record in obd_data]
+    # Compact JSON, several records per document: fewer tokens and fewer chunks
+    docs = [
+        Document(text=orjson.dumps(obd_data[i : i + RECORDS_PER_DOCUMENT]).decode())
+        for i in range(0, len(obd_data), RECORDS_PER_DOCUMENT)
+    ]
     index = VectorStoreIndex.from_documents(docs)
     query_engine = index.as_query_engine()
 
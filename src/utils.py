@@ -1,10 +1,22 @@
-import json
+import csv
+import io
 import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import cache, lru_cache
+from threading import Lock
 
 import dspy
+import numpy as np
+import orjson
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import Dialect, InfluxDBClient
+from influxdb_client.client.write_api import WriteOptions
 from loguru import logger
 from pydantic import BaseModel
 
@@ -12,6 +24,46 @@ load_dotenv()
 
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET")
 VEHICLE_ID = os.getenv("VEHICLE_ID", "vehicle_001")
+LLM_RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", 256))
+LLM_RESPONSE_TTL = float(os.getenv("LLM_RESPONSE_TTL", 60))
+LLM_READINGS_TAIL = int(os.getenv("LLM_READINGS_TAIL", 5))
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", 0.92))
+# Ollama embedding model for the semantic answer cache; unset disables the cache
+LLM_SEMANTIC_CACHE_MODEL = os.getenv("LLM_SEMANTIC_CACHE_MODEL")
+DB_QUERY_TTL = float(os.getenv("DB_QUERY_TTL", 30))
+
+# At least enough pooled connections for the batch writer and concurrent
+# queries, and never below the client's own default of 5 per CPU
+INFLUXDB_POOL_SIZE = max(
+    int(os.getenv("INFLUXDB_POOL_SIZE", 16)), (os.cpu_count() or 1) * 5
+)
+
+# Points are buffered and flushed in the background by the client's batcher
+WRITE_OPTIONS = WriteOptions(
+    batch_size=500,
+    flush_interval=1_000,
+    jitter_interval=200,
+    retry_interval=5_000,
+    max_retries=3,
+    max_retry_delay=30_000,
+    exponential_base=2,
+)
+
+# Plain CSV without annotation rows, for queries that only need raw values
+CSV_DIALECT = Dialect(
+    header=True,
+    annotations=[],
+    delimiter=",",
+    comment_prefix="#",
+    date_time_format="RFC3339",
+)
+
+# Non-underscore columns Flux adds to every record
+_METADATA_COLUMNS = frozenset({"result", "table"})
+
+# Identical queries within DB_QUERY_TTL seconds are answered from memory
+_QUERY_CACHE = TTLCache(maxsize=128, ttl=DB_QUERY_TTL)
+_QUERY_CACHE_LOCK = Lock()
 
 
 # ============================================
@@ -41,190 +93,402 @@ class OBDMetric(BaseModel):
     dtc_count: int
 
 
+# ============================================
+# FLUX QUERIES
+# ============================================
+
+RECENT_DATA_QUERY = """
+from(bucket: params.bucket)
+  |> range(start: params.start)
+  |> filter(fn: (r) => r["_measurement"] == "obd_readings")
+  |> filter(fn: (r) => r["vehicle_id"] == params.vehicle_id)
+  |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> group()
+  |> sort(columns: ["_time"])
+  |> tail(n: params.limit)
+"""
+
+# last() keeps one point per series, so only a handful of rows are pivoted
+LATEST_READING_QUERY = """
+from(bucket: params.bucket)
+  |> range(start: -24h)
+  |> filter(fn: (r) => r["_measurement"] == "obd_readings")
+  |> filter(fn: (r) => r["vehicle_id"] == params.vehicle_id)
+  |> last()
+  |> group()
+  |> pivot(
+    rowKey: ["_time", "vehicle_id", "mil_status"],
+    columnKey: ["_field"],
+    valueColumn: "_value",
+  )
+  |> sort(columns: ["_time"], desc: true)
+  |> limit(n: 1)
+"""
+
+# Aggregates are computed by InfluxDB; five rows come back per field
+FIELD_STATS_QUERY = """
+data = from(bucket: params.bucket)
+  |> range(start: params.start)
+  |> filter(fn: (r) => r["_measurement"] == "obd_readings")
+  |> filter(fn: (r) => r["vehicle_id"] == params.vehicle_id)
+  |> filter(fn: (r) => contains(value: r["_field"], set: params.fields))
+  |> group(columns: ["_field"])
+  |> toFloat()
+
+union(tables: [
+    data |> min() |> set(key: "_stat", value: "min"),
+    data |> max() |> set(key: "_stat", value: "max"),
+    data |> mean() |> set(key: "_stat", value: "mean"),
+    data |> stddev() |> set(key: "_stat", value: "stddev"),
+    data |> count() |> toFloat() |> set(key: "_stat", value: "count"),
+])
+  |> keep(columns: ["_field", "_stat", "_value"])
+"""
+
+# Series split by the mil_status tag are merged so windows span all points
+# and only the most recent max_points windows are returned
+AGGREGATED_DATA_QUERY = """
+from(bucket: params.bucket)
+  |> range(start: params.start)
+  |> filter(fn: (r) => r["_measurement"] == "obd_readings")
+  |> filter(fn: (r) => r["_field"] == params.field)
+  |> filter(fn: (r) => r["vehicle_id"] == params.vehicle_id)
+  |> group()
+  |> sort(columns: ["_time"])
+  |> aggregateWindow(every: duration(v: params.every), fn: mean, createEmpty: false)
+  |> tail(n: params.limit)
+  |> keep(columns: ["_time", "_value"])
+"""
+
+# dtc_count is a field and mil_status a tag, so the field is pivoted into a column
+MIL_STATUS_HISTORY_QUERY = """
+from(bucket: params.bucket)
+  |> range(start: params.start)
+  |> filter(fn: (r) => r["_measurement"] == "obd_readings")
+  |> filter(fn: (r) => r["vehicle_id"] == params.vehicle_id)
+  |> filter(fn: (r) => r["_field"] == "dtc_count")
+  |> keep(columns: ["_time", "_field", "_value", "mil_status"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> group()
+  |> sort(columns: ["_time"])
+"""
+
+
 # ============================================
 # DB SETUP
 # ============================================
 
 
+@dataclass(frozen=True, slots=True)
+class InfluxConfig:
+    """InfluxDB connection settings"""
+
+    url: str
+    token: str
+    org: str
+    bucket: str
+    vehicle_id: str
+
+
+@cache
+def _load_influx_config():
+    """
+    Read and validate InfluxDB settings from the environment once.
+    Deferred to the first DB() so modules importing DB don't need InfluxDB set up
+    """
+    config = InfluxConfig(
+        url=os.getenv("INFLUXDB_URL"),
+        token=os.getenv("INFLUXDB_TOKEN"),
+        org=os.getenv("INFLUXDB_ORG"),
+        bucket=INFLUXDB_BUCKET,
+        vehicle_id=VEHICLE_ID,
+    )
+
+    # Validate InfluxDB settings (required)
+    if not config.url:
+        raise ValueError("INFLUXDB_URL environment variable is required")
+    if not config.token:
+        raise ValueError("INFLUXDB_TOKEN environment variable is required")
+    if not config.org:
+        raise ValueError("INFLUXDB_ORG environment variable is required")
+    if not config.bucket:
+        raise ValueError("INFLUXDB_BUCKET environment variable is required")
+
+    return config
+
+
 class DB:
+    __slots__ = ("_config", "_client", "_write_api", "_query_api", "failed_batches")
+
     def __init__(self):
-        self.__url = os.getenv("INFLUXDB_URL")
-        self.__token = os.getenv("INFLUXDB_TOKEN")
-        self.__org = os.getenv("INFLUXDB_ORG")
-        self.__bucket = INFLUXDB_BUCKET
-        self.__vehicle_id = VEHICLE_ID
-        self.__client = None
-
-        # Validate InfluxDB settings (required)
-        if not self.__url:
-            raise ValueError("INFLUXDB_URL environment variable is required")
-        if not self.__token:
-            raise ValueError("INFLUXDB_TOKEN environment variable is required")
-        if not self.__org:
-            raise ValueError("INFLUXDB_ORG environment variable is required")
-        if not self.__bucket:
-            raise ValueError("INFLUXDB_BUCKET environment variable is required")
+        self._config = _load_influx_config()
+        self._client = None
+        self._write_api = None
+        self._query_api = None
+
+        # Batches the writer gave up on; writes themselves never raise
+        self.failed_batches = 0
 
     def __enter__(self):
-        logger.debug(f"Connecting to InfluxDB: {self.__url}")
-        self.__client = InfluxDBClient(
-            url=self.__url, token=self.__token, org=self.__org
+        logger.debug(f"Connecting to InfluxDB: {self._config.url}")
+        self._client = InfluxDBClient(
+            url=self._config.url,
+            token=self._config.token,
+            org=self._config.org,
+            enable_gzip=True,
+            connection_pool_maxsize=INFLUXDB_POOL_SIZE,
+        )
+        self._write_api = self._client.write_api(
+            write_options=WRITE_OPTIONS,
+            success_callback=self._on_batch_written,
+            error_callback=self._on_batch_failed,
+            retry_callback=self._on_batch_retry,
         )
-        logger.success(f"InfluxDB Connection Opened. Bucket: {self.__bucket}")
-        logger.debug(f"Vehicle ID: {self.__vehicle_id}")
+        self._query_api = self._client.query_api()
+        logger.success(f"InfluxDB Connection Opened. Bucket: {self._config.bucket}")
+        logger.debug(f"Vehicle ID: {self._config.vehicle_id}")
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.__client.close()
+        # Flush any buffered points before closing the connection
+        self._write_api.close()
+        self._client.close()
         logger.debug("InfluxDB Connection Closed")
 
     def store_data(self, data):
-        write_api = self.__client.write_api(write_options=SYNCHRONOUS)
-        write_api.write(bucket=self.__bucket, record=data)
+        # Points are only queued here; the cache is cleared once they are written
+        self._write_api.write(bucket=self._config.bucket, record=data)
+
+    def _on_batch_written(self, conf, data):
+        """Called by the batching writer after a batch reaches InfluxDB"""
+        self.invalidate_cache()
+
+    def _on_batch_failed(self, conf, data, exception):
+        """Called by the batching writer when a batch is dropped"""
+        self.failed_batches += 1
+        logger.error(f"InfluxDB write failed, batch dropped: {exception}")
+
+    def _on_batch_retry(self, conf, data, exception):
+        """Called by the batching writer before a batch is retried"""
+        logger.warning(f"InfluxDB write failed, retrying: {exception}")
+
+    @cached(
+        cache=_QUERY_CACHE,
+        key=lambda self, query, params=None: hashkey(query, repr(params)),
+        lock=_QUERY_CACHE_LOCK,
+    )
+    def get_data(self, query, params=None):
+        records = self._query_api.query_stream(
+            query=query, org=self._config.org, params=params
+        )
+        return tuple(records)
+
+    @cached(
+        cache=_QUERY_CACHE,
+        key=lambda self, query, params=None: hashkey("rows", query, repr(params)),
+        lock=_QUERY_CACHE_LOCK,
+    )
+    def get_rows(self, query, params=None):
+        """Run a query and return its rows as plain dicts of CSV strings"""
+        response = self._query_api.query_raw(
+            query=query, org=self._config.org, dialect=CSV_DIALECT, params=params
+        )
+        reader = csv.reader(io.StringIO(response.data.decode("utf-8")))
+
+        rows = []
+        columns = None
+        for row in reader:
+            # Tables are separated by blank lines
+            if not row:
+                continue
 
-    def get_data(self, query):
-        query_api = self.__client.query_api()
-        result = query_api.query(query=query, org=self.__org)
-        return result
+            # Without annotations the header row repeats whenever the schema
+            # changes, and the column order can differ from the previous table
+            if "result" in row and "table" in row:
+                columns = row
+                continue
+
+            rows.append(dict(zip(columns, row)))
+
+        return tuple(rows)
+
+    def invalidate_cache(self):
+        """Drop cached query results so the next reads see written data"""
+        with _QUERY_CACHE_LOCK:
+            _QUERY_CACHE.clear()
 
     def get_recent_data(self, hours=1, limit=100):
         """Get recent OBD data for vehicle"""
 
-        query = f"""
-        from(bucket: "{self.__bucket}")
-          |> range(start: -{hours}h)
-          |> filter(fn: (r) => r["_measurement"] == "obd_readings")
-          |> filter(fn: (r) => r["vehicle_id"] == "{self.__vehicle_id}")
-          |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-          |> limit(n: {limit})
-        """
-
-        result = self.get_data(query=query)
-        return self._parse_pivoted_results(result)
+        records = self.get_data(
+            query=RECENT_DATA_QUERY,
+            params={
+                "bucket": self._config.bucket,
+                "start": timedelta(hours=-hours),
+                "vehicle_id": self._config.vehicle_id,
+                "limit": limit,
+            },
+        )
+        return list(self._parse_pivoted_results(records))
 
     def get_latest_reading(self):
         """Get the most recent OBD reading for a vehicle"""
-        query = f"""
-        from(bucket: "{self.__bucket}")
-          |> range(start: -24h)
-          |> filter(fn: (r) => r["_measurement"] == "obd_readings")
-          |> filter(fn: (r) => r["vehicle_id"] == "{self.__vehicle_id}")
-          |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-          |> sort(columns: ["_time"], desc: true)
-          |> limit(n: 1)
-        """
 
-        result = self.get_data(query=query)
-        data = self._parse_pivoted_results(result)
-        return data[0] if data else None
+        records = self.get_data(
+            query=LATEST_READING_QUERY,
+            params={
+                "bucket": self._config.bucket,
+                "vehicle_id": self._config.vehicle_id,
+            },
+        )
+        return next(self._parse_pivoted_results(records), None)
 
     def get_field_stats(self, field, hours=24):
-        """Get statistics (min, max, mean) for a specific field"""
-
-        query = f"""
-        from(bucket: "{self.__bucket}")
-          |> range(start: -{hours}h)
-          |> filter(fn: (r) => r["_measurement"] == "obd_readings")
-          |> filter(fn: (r) => r["_field"] == "{field}")
-          |> filter(fn: (r) => r["vehicle_id"] == "{self.__vehicle_id}")
-        """
-
-        result = self.get_data(query=query)
-        values = [record.get_value() for table in result for record in table.records]
+        """Get statistics (min, max, mean, stddev) for a specific field"""
+        return self.get_multi_field_stats([field], hours).get(field)
+
+    def get_multi_field_stats(self, fields, hours=24):
+        """Get statistics (min, max, mean, stddev) for several fields at once"""
+
+        rows = self.get_rows(
+            query=FIELD_STATS_QUERY,
+            params={
+                "bucket": self._config.bucket,
+                "start": timedelta(hours=-hours),
+                "vehicle_id": self._config.vehicle_id,
+                "fields": list(fields),
+            },
+        )
 
-        if not values:
-            return None
+        values = {}
+        for row in rows:
+            # stddev is null for fields with fewer than two points
+            if row["_value"]:
+                stats = values.setdefault(row["_field"], {})
+                stats[row["_stat"]] = float(row["_value"])
 
         return {
-            "field": field,
-            "min": min(values),
-            "max": max(values),
-            "mean": sum(values) / len(values),
-            "count": len(values),
+            field: {
+                "field": field,
+                "min": stats["min"],
+                "max": stats["max"],
+                "mean": stats["mean"],
+                "stddev": stats.get("stddev"),
+                "count": int(stats["count"]),
+            }
+            for field, stats in values.items()
+            if stats.get("count")
         }
 
-    def get_aggregated_data(self, field, hours=24, window="10m"):
+    def get_aggregated_data(self, field, hours=24, window="10m", max_points=20):
         """Get aggregated data for a specific field over time"""
 
-        query = f"""
-        from(bucket: "{self.__bucket}")
-          |> range(start: -{hours}h)
-          |> filter(fn: (r) => r["_measurement"] == "obd_readings")
-          |> filter(fn: (r) => r["_field"] == "{field}")
-          |> filter(fn: (r) => r["vehicle_id"] == "{self.__vehicle_id}")
-          |> aggregateWindow(every: {window}, fn: mean, createEmpty: false)
-        """
-
-        result = self.get_data(query=query)
-        return [
-            {"time": record.get_time().isoformat(), "value": record.get_value()}
-            for table in result
-            for record in table.records
-        ]
+        rows = self.get_rows(
+            query=AGGREGATED_DATA_QUERY,
+            params={
+                "bucket": self._config.bucket,
+                "start": timedelta(hours=-hours),
+                "field": field,
+                "vehicle_id": self._config.vehicle_id,
+                "every": window,
+                "limit": max_points,
+            },
+        )
+        return (
+            {
+                "time": datetime.fromisoformat(row["_time"]).isoformat(),
+                "value": float(row["_value"]),
+            }
+            for row in rows
+        )
 
     def get_mil_status_history(self, hours=24):
         """Get check engine light status history"""
-        query = f"""
-        from(bucket: "{self.__bucket}")
-          |> range(start: -{hours}h)
-          |> filter(fn: (r) => r["_measurement"] == "obd_readings")
-          |> filter(fn: (r) => r["vehicle_id"] == "{self.__vehicle_id}")
-          |> keep(columns: ["_time", "mil_status", "dtc_count"])
-          |> group()
-        """
 
-        result = self.get_data(query=query)
-        return self._parse_results(result)
-
-    def _parse_pivoted_results(self, result):
-        """Parse pivoted InfluxDB query results"""
-        data_points = []
-        for table in result:
-            for record in table.records:
-                point = {"time": record.get_time().isoformat()}
-
-                # Add all fields from the record
-                for key, value in record.values.items():
-                    if not key.startswith("_") and key not in ["result", "table"]:
-                        point[key] = value
-
-                data_points.append(point)
-        return data_points
-
-    def _parse_results(self, result):
-        """Parse standard InfluxDB query results"""
-        data_points = []
-        for table in result:
-            for record in table.records:
-                data_points.append(
-                    {
-                        "time": record.get_time().isoformat(),
-                        "field": record.get_field(),
-                        "value": record.get_value(),
-                        "measurement": record.get_measurement(),
-                    }
-                )
-        return data_points
+        records = self.get_data(
+            query=MIL_STATUS_HISTORY_QUERY,
+            params={
+                "bucket": self._config.bucket,
+                "start": timedelta(hours=-hours),
+                "vehicle_id": self._config.vehicle_id,
+            },
+        )
+        return self._parse_pivoted_results(records)
+
+    def _parse_pivoted_results(self, records):
+        """Parse pivoted InfluxDB query records"""
+        for record in records:
+            point = {"time": record.get_time().isoformat()}
+
+            # Add all fields from the record, skipping Flux metadata columns
+            point.update(
+                (key, value)
+                for key, value in record.values.items()
+                if key not in _METADATA_COLUMNS and not key.startswith("_")
+            )
+
+            yield point
 
 
 # ============================================
 # DSPY SETUP
 # ============================================
 
+# Normal operating ranges shared by every prompt that judges readings
+NORMAL_OPERATING_RANGES = """\
+- Engine RPM: 600-900 idle, 1500-3000 driving
+- Coolant temp: 85-105°C (warning if >105°C)
+- Oil temp: 90-110°C (warning if >120°C)
+- Battery voltage: 12.6-14.4V (warning if <12V or >15V)
+- Fuel pressure: 250-350 kPa
+- Throttle position: 0% idle, varies with acceleration
+"""
+
+# Static context sent ahead of the readings in every prompt, so providers
+# that cache prompt prefixes can reuse it across calls
+OBD_REFERENCE = f"""\
+Vehicle ID: {VEHICLE_ID}
+
+OBD-II parameters (unit):
+  - rpm: engine speed (rpm)
+  - speed: vehicle speed (km/h)
+  - throttle_position: throttle opening (%)
+  - engine_load: calculated engine load (%)
+  - runtime: time since engine start (seconds)
+  - coolant_temp: engine coolant temperature (°C)
+  - intake_temp: intake air temperature (°C)
+  - oil_temp: engine oil temperature (°C)
+  - ambient_temp: outside air temperature (°C)
+  - fuel_level: fuel tank level (%)
+  - fuel_pressure: fuel rail pressure (kPa)
+  - fuel_rate: fuel consumption (L/h)
+  - maf: mass air flow (g/s)
+  - intake_pressure: intake manifold pressure (kPa)
+  - barometric_pressure: atmospheric pressure (kPa)
+  - battery_voltage: system voltage (V)
+  - distance: odometer distance (km)
+  - mil_status: check engine light (True when on)
+  - dtc_count: number of active diagnostic trouble codes
+
+Normal operating ranges:
+{NORMAL_OPERATING_RANGES}"""
+
 
 class OBDDataAnalysis(dspy.Signature):
     """Analyze OBD vehicle data and provide insights"""
 
-    obd_data = dspy.InputField(desc="Raw OBD data from vehicle sensors")
+    reference = dspy.InputField(desc="Vehicle and OBD parameter reference")
     question = dspy.InputField(desc="Question about the vehicle data")
+    obd_data = dspy.InputField(desc="Raw OBD data from vehicle sensors")
     analysis = dspy.OutputField(desc="Detailed analysis and answer to the question")
 
 
 class VehicleDiagnostics(dspy.Signature):
     """Diagnose potential vehicle issues from OBD data"""
 
-    current_reading = dspy.InputField(desc="Current OBD sensor readings")
+    reference = dspy.InputField(desc="Vehicle and OBD parameter reference")
     statistics = dspy.InputField(desc="Statistical summary of recent readings")
+    current_reading = dspy.InputField(desc="Current OBD sensor readings")
     diagnostics = dspy.OutputField(
         desc="Diagnostic assessment, potential issues, and recommendations"
     )
@@ -233,8 +497,9 @@ class VehicleDiagnostics(dspy.Signature):
 class TrendAnalysis(dspy.Signature):
     """Analyze trends in vehicle data over time"""
 
+    reference = dspy.InputField(desc="Vehicle and OBD parameter reference")
     field_name = dspy.InputField(desc="Name of the sensor/field being analyzed")
-    statistics = dspy.InputField(desc="Min, max, mean values over time period")
+    statistics = dspy.InputField(desc="Min, max, mean, stddev values over time period")
     time_series = dspy.InputField(desc="Time-series data points")
     analysis = dspy.OutputField(desc="Trend analysis and insights")
 
@@ -242,9 +507,10 @@ class TrendAnalysis(dspy.Signature):
 class MaintenanceAdvisor(dspy.Signature):
     """Provide maintenance recommendations based on OBD data"""
 
-    obd_readings = dspy.InputField(desc="Current vehicle sensor readings")
-    dtc_info = dspy.InputField(desc="Diagnostic trouble code information")
+    reference = dspy.InputField(desc="Vehicle and OBD parameter reference")
     mileage = dspy.InputField(desc="Total distance traveled")
+    dtc_info = dspy.InputField(desc="Diagnostic trouble code information")
+    obd_readings = dspy.InputField(desc="Current vehicle sensor readings")
     recommendations = dspy.OutputField(
         desc="Maintenance recommendations based on OBD data"
     )
@@ -258,7 +524,9 @@ class OBDQueryModule(dspy.Module):
         self.analyze = dspy.ChainOfThought(OBDDataAnalysis)
 
     def forward(self, obd_data, question):
-        return self.analyze(obd_data=obd_data, question=question)
+        return self.analyze(
+            reference=OBD_REFERENCE, question=question, obd_data=obd_data
+        )
 
 
 class DiagnosticsModule(dspy.Module):
@@ -269,7 +537,11 @@ class DiagnosticsModule(dspy.Module):
         self.diagnose = dspy.ChainOfThought(VehicleDiagnostics)
 
     def forward(self, current_reading, statistics):
-        return self.diagnose(current_reading=current_reading, statistics=statistics)
+        return self.diagnose(
+            reference=OBD_REFERENCE,
+            statistics=statistics,
+            current_reading=current_reading,
+        )
 
 
 class TrendModule(dspy.Module):
@@ -281,7 +553,10 @@ class TrendModule(dspy.Module):
 
     def forward(self, field_name, statistics, time_series):
         return self.analyze_trend(
-            field_name=field_name, statistics=statistics, time_series=time_series
+            reference=OBD_REFERENCE,
+            field_name=field_name,
+            statistics=statistics,
+            time_series=time_series,
         )
 
 
@@ -294,8 +569,107 @@ class MaintenanceModule(dspy.Module):
 
     def forward(self, obd_readings, dtc_info, mileage):
         return self.advise(
-            obd_readings=obd_readings, dtc_info=dtc_info, mileage=mileage
+            reference=OBD_REFERENCE,
+            mileage=mileage,
+            dtc_info=dtc_info,
+            obd_readings=obd_readings,
+        )
+
+
+# The LM and modules are process-wide; LLM instances share them.
+# DSPy's own response cache is off so answers expire with LLM_RESPONSE_TTL
+_LM = dspy.LM(
+    model=os.getenv("LLM_API_MODEL", "ollama_chat/tinyllama"),
+    api_key=os.getenv("LLM_API_KEY", "ollama"),
+    api_base=os.getenv("LLM_API_BASE", "http://localhost:11434"),
+    cache=False,
+)
+if dspy.settings.lm is None:
+    dspy.settings.configure(lm=_LM)
+
+# Optional cheaper model for simple lookups and numeric trend summaries
+_FAST_LM = (
+    dspy.LM(
+        model=os.getenv("LLM_API_FAST_MODEL"),
+        api_key=os.getenv("LLM_API_KEY", "ollama"),
+        api_base=os.getenv("LLM_API_BASE", "http://localhost:11434"),
+        cache=False,
+    )
+    if os.getenv("LLM_API_FAST_MODEL")
+    else None
+)
+
+# Short lookups like "what is the current rpm?" don't need the main model
+_SIMPLE_QUESTION = re.compile(r"^(what|show|current)\b.*\?$", re.IGNORECASE)
+
+
+@cache
+def _get_module(module_class):
+    """Build a DSPy module on first use and share it process-wide"""
+    return module_class()
+
+
+# ============================================
+# SEMANTIC CACHE
+# ============================================
+
+
+class SemanticCache:
+    """
+    Answers looked up by question similarity, for a given data context
+    """
+
+    __slots__ = ("_embedder", "_threshold", "_vectors", "_entries")
+
+    def __init__(self, model, threshold=LLM_SEMANTIC_CACHE_THRESHOLD, maxsize=1024):
+        self._embedder = dspy.Embedder(
+            f"ollama/{model}",
+            api_base=os.getenv("LLM_API_BASE", "http://localhost:11434"),
         )
+        self._threshold = threshold
+
+        # Oldest entries are evicted first once maxsize is reached
+        self._vectors = deque(maxlen=maxsize)
+        self._entries = deque(maxlen=maxsize)
+
+    def embed(self, text):
+        """Embed text as a unit vector, or None if embedding is unavailable"""
+        if self._embedder is None:
+            return None
+
+        try:
+            vector = np.asarray(self._embedder(text), dtype=np.float32)
+        except Exception as e:
+            # Don't pay for a failing request on every later call
+            logger.warning(f"Semantic cache disabled: {e}")
+            self._embedder = None
+            return None
+
+        return vector / np.linalg.norm(vector)
+
+    def get(self, vector, context):
+        """Get the answer to the most similar question asked in the same context"""
+        if vector is None or not self._vectors:
+            return None
+
+        scores = np.stack(self._vectors) @ vector
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self._threshold:
+                break
+
+            entry_context, answer = self._entries[index]
+            if entry_context == context:
+                return answer
+
+        return None
+
+    def put(self, vector, context, answer):
+        """Store an answer for a question vector in a context"""
+        if vector is None:
+            return
+
+        self._vectors.append(vector)
+        self._entries.append((context, answer))
 
 
 # ============================================
@@ -303,57 +677,155 @@ class MaintenanceModule(dspy.Module):
 # ============================================
 
 
+# (section, ((label, reading key, unit suffix), ...)) in prompt order
+READING_SECTIONS = (
+    (
+        "Engine",
+        (
+            ("RPM", "rpm", " rpm"),
+            ("Speed", "speed", " km/h"),
+            ("Throttle Position", "throttle_position", "%"),
+            ("Engine Load", "engine_load", "%"),
+            ("Runtime", "runtime", " seconds"),
+        ),
+    ),
+    (
+        "Temperatures",
+        (
+            ("Coolant", "coolant_temp", "°C"),
+            ("Intake Air", "intake_temp", "°C"),
+            ("Oil", "oil_temp", "°C"),
+            ("Ambient", "ambient_temp", "°C"),
+        ),
+    ),
+    (
+        "Fuel System",
+        (
+            ("Fuel Level", "fuel_level", "%"),
+            ("Fuel Pressure", "fuel_pressure", " kPa"),
+            ("Fuel Rate", "fuel_rate", " L/h"),
+        ),
+    ),
+    (
+        "Air Flow",
+        (
+            ("MAF", "maf", " g/s"),
+            ("Intake Pressure", "intake_pressure", " kPa"),
+            ("Barometric Pressure", "barometric_pressure", " kPa"),
+        ),
+    ),
+    (
+        "Other",
+        (
+            ("Battery Voltage", "battery_voltage", " V"),
+            ("Distance", "distance", " km"),
+            ("MIL Status", "mil_status", ""),
+            ("DTC Count", "dtc_count", ""),
+        ),
+    ),
+)
+
+
+@lru_cache(maxsize=32)
+def _format_reading_items(items, current=True):
+    """Format a reading, given as sorted (key, value) pairs, for LLM"""
+    reading = dict(items)
+    time = reading.get("time", "Unknown")
+
+    # Only a single latest reading is presented as the current state
+    if current:
+        lines = ["Current Vehicle Readings:", f"Time: {time}"]
+    else:
+        lines = [f"Reading at {time}:"]
+    lines.append(f"Vehicle ID: {reading.get('vehicle_id', VEHICLE_ID)}")
+
+    # Sensors without a value are left out rather than sent as "None"
+    for section, fields in READING_SECTIONS:
+        values = [
+            f"  - {label}: {reading[key]}{unit}"
+            for label, key, unit in fields
+            if reading.get(key) is not None
+        ]
+        if values:
+            lines += ["", f"{section}:", *values]
+
+    return "\n".join(lines) + "\n"
+
+
+def _dumps_json(data):
+    """Serialize prompt data to compact JSON text (indentation only adds tokens)"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 class LLM:
     """
     LLM engine for querying and analyzing OBD data
     """
 
+    __slots__ = ("_db", "_response_cache", "_semantic_cache")
+
     def __init__(self, model=None):
         # Setup InfluxDB
-        self.__db = DB()
+        self._db = DB()
 
-        # Setup DSPy with LLM
-        lm = dspy.LM(
-            model=os.getenv("LLM_API_MODEL", "ollama_chat/tinyllama"),
-            api_key=os.getenv("LLM_API_KEY", "ollama"),
-            api_base=os.getenv("LLM_API_BASE", "http://localhost:11434"),
+        # All LLM tasks here are informational (read-only analysis), so an
+        # identical prompt can safely be answered with the earlier response
+        # for a while (e.g. a dashboard polling diagnose)
+        self._response_cache = TTLCache(
+            maxsize=LLM_RESPONSE_CACHE_SIZE, ttl=LLM_RESPONSE_TTL
+        )
+        self._semantic_cache = (
+            SemanticCache(LLM_SEMANTIC_CACHE_MODEL)
+            if LLM_SEMANTIC_CACHE_MODEL
+            else None
         )
-        dspy.settings.configure(lm=lm)
-
-        # Initialize DSPy modules
-        self.__query_module = OBDQueryModule()
-        self.__diagnostics_module = DiagnosticsModule()
-        self.__trend_module = TrendModule()
-        self.__maintenance_module = MaintenanceModule()
 
     def __enter__(self):
-        self.__db.__enter__()
+        self._db.__enter__()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.__db.__exit__(exc_type, exc_value, traceback)
+        self._db.__exit__(exc_type, exc_value, traceback)
 
     def query(self, question, hours=1):
         """Query OBD data"""
+        return "".join(self.query_stream(question, hours))
+
+    def query_stream(self, question, hours=1):
+        """Query OBD data, yielding the analysis as it is generated"""
         # Retrieve recent data from InfluxDB
-        data = self.__db.get_recent_data(vehicle_id=VEHICLE_ID, hours=hours)
+        data = self._db.get_recent_data(hours=hours, limit=LLM_READINGS_TAIL)
 
         # Format data for DSPy
         formatted_data = self._format_readings(data)
 
         # print(data)
 
-        # Get response from DSPy
-        response = self.__query_module(obd_data=formatted_data, question=question)
+        # Reuse the answer to a near-identical question about the same data
+        if self._semantic_cache is not None:
+            context = hash((hours, formatted_data))
+            question_vector = self._semantic_cache.embed(question)
+            analysis = self._semantic_cache.get(question_vector, context)
+            if analysis is not None:
+                yield analysis
+                return
+
+        # Stream response from DSPy
+        response, cached = yield from self._predict_stream(
+            _get_module(OBDQueryModule),
+            self._pick_model("query", question),
+            "analysis",
+            obd_data=formatted_data,
+            question=question,
+        )
 
-        return response.analysis
+        # An exact repeat is already cached; storing it again would only
+        # push other questions out of the semantic cache
+        if self._semantic_cache is not None and not cached:
+            self._semantic_cache.put(question_vector, context, response.analysis)
 
     def diagnose(self, hours=24):
         """Get diagnostic assessment of vehicle health"""
-        # Get latest reading
-        latest = self.__db.get_latest_reading(VEHICLE_ID)
-
-        # Get statistics for key parameters
         key_fields = [
             "rpm",
             "coolant_temp",
@@ -361,46 +833,51 @@ class LLM:
             "fuel_rate",
             "battery_voltage",
         ]
-        stats = {}
-        for field in key_fields:
-            field_stats = self.__db.get_field_stats(field, VEHICLE_ID, hours)
-            if field_stats:
-                stats[field] = field_stats
+
+        # The queries are independent, so fetch the latest reading in the
+        # background while the statistics for key parameters are computed
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            latest_future = executor.submit(self._db.get_latest_reading)
+            stats = self._db.get_multi_field_stats(key_fields, hours)
+            latest = latest_future.result()
 
         # Format for DSPy
         current_formatted = self._format_reading(latest)
-        stats_formatted = json.dumps(stats, indent=2)
+        stats_formatted = _dumps_json(stats)
 
-        response = self.__diagnostics_module(
-            current_reading=current_formatted, statistics=stats_formatted
+        response = self._predict(
+            _get_module(DiagnosticsModule),
+            self._pick_model("diagnose"),
+            current_reading=current_formatted,
+            statistics=stats_formatted,
         )
         return response.diagnostics
 
     def analyze_trend(self, field_name, hours=24):
         """Analyze trends for a specific sensor/field"""
-        # Get statistics
-        stats = self.__db.get_field_stats(field_name, VEHICLE_ID, hours)
-
-        # Get time series data
-        time_series = self.__db.get_aggregated_data(
-            field_name, VEHICLE_ID, hours, window="10m"
-        )
+        # Get statistics and time series data concurrently
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            stats_future = executor.submit(self._db.get_field_stats, field_name, hours)
+            time_series = list(
+                self._db.get_aggregated_data(field_name, hours, window="10m")
+            )
+            stats = stats_future.result()
 
         if not stats or not time_series:
             return f"No data available for {field_name}"
 
-        response = self.__trend_module(
+        response = self._predict(
+            _get_module(TrendModule),
+            self._pick_model("trend"),
             field_name=field_name,
-            statistics=json.dumps(stats, indent=2),
-            time_series=json.dumps(
-                time_series[:20], indent=2
-            ),  # Limit to recent points
+            statistics=_dumps_json(stats),
+            time_series=_dumps_json(time_series),
         )
         return response.analysis
 
     def get_maintenance_advice(self):
         """Get maintenance recommendations"""
-        latest = self.__db.get_latest_reading(VEHICLE_ID)
+        latest = self._db.get_latest_reading()
 
         if not latest:
             return "No recent data available"
@@ -415,68 +892,100 @@ class LLM:
         # Get mileage
         mileage = latest.get("distance", 0)
 
-        response = self.__maintenance_module(
-            obd_readings=readings_formatted, dtc_info=dtc_info, mileage=str(mileage)
+        response = self._predict(
+            _get_module(MaintenanceModule),
+            self._pick_model("maintenance"),
+            obd_readings=readings_formatted,
+            dtc_info=dtc_info,
+            mileage=str(mileage),
         )
         return response.recommendations
 
-    def _format_reading(self, reading):
-        """Format a single OBD reading for LLM"""
-        if not reading:
-            return "No data available"
+    def _pick_model(self, task, question=None):
+        """Pick the fast model for simple tasks, the configured model otherwise"""
+        if _FAST_LM is None:
+            return dspy.settings.lm
+
+        if task == "trend":
+            return _FAST_LM
+
+        if task == "query" and (
+            len(question.split()) < 8 or _SIMPLE_QUESTION.match(question.strip())
+        ):
+            return _FAST_LM
+
+        return dspy.settings.lm
+
+    def _predict(self, module, lm, **inputs):
+        """Run a DSPy module, reusing the response for an identical prompt"""
+        key = (type(module).__name__, *inputs.items())
+
+        response = self._response_cache.get(key)
+        if response is None:
+            with dspy.context(lm=lm):
+                response = self._response_cache[key] = module(**inputs)
+
+        return response
 
-        formatted = "Current Vehicle Readings:\n"
-        formatted += f"Time: {reading.get('time', 'Unknown')}\n"
-        formatted += f"Vehicle ID: {reading.get('vehicle_id', VEHICLE_ID)}\n\n"
-
-        # Engine parameters
-        formatted += "Engine:\n"
-        formatted += f"  - RPM: {reading.get('rpm')} rpm\n"
-        formatted += f"  - Speed: {reading.get('speed')} km/h\n"
-        formatted += f"  - Throttle Position: {reading.get('throttle_position')}%\n"
-        formatted += f"  - Engine Load: {reading.get('engine_load')}%\n"
-        formatted += f"  - Runtime: {reading.get('runtime')} seconds\n\n"
-
-        # Temperature sensors
-        formatted += "Temperatures:\n"
-        formatted += f"  - Coolant: {reading.get('coolant_temp')}°C\n"
-        formatted += f"  - Intake Air: {reading.get('intake_temp')}°C\n"
-        formatted += f"  - Oil: {reading.get('oil_temp')}°C\n"
-        formatted += f"  - Ambient: {reading.get('ambient_temp')}°C\n\n"
-
-        # Fuel system
-        formatted += "Fuel System:\n"
-        formatted += f"  - Fuel Level: {reading.get('fuel_level')}%\n"
-        formatted += f"  - Fuel Pressure: {reading.get('fuel_pressure')} kPa\n"
-        formatted += f"  - Fuel Rate: {reading.get('fuel_rate')} L/h\n\n"
-
-        # Air flow
-        formatted += "Air Flow:\n"
-        formatted += f"  - MAF: {reading.get('maf')} g/s\n"
-        formatted += f"  - Intake Pressure: {reading.get('intake_pressure')} kPa\n"
-        formatted += (
-            f"  - Barometric Pressure: {reading.get('barometric_pressure')} kPa\n\n"
+    def _predict_stream(self, module, lm, output_field, **inputs):
+        """
+        Run a DSPy module, yielding chunks of one output field as they arrive.
+        Returns the final prediction, reusing the response for an identical prompt,
+        and whether it came from the response cache
+        """
+        key = (type(module).__name__, *inputs.items())
+
+        response = self._response_cache.get(key)
+        if response is not None:
+            yield getattr(response, output_field)
+            return response, True
+
+        program = dspy.streamify(
+            module,
+            stream_listeners=[
+                dspy.streaming.StreamListener(signature_field_name=output_field)
+            ],
+            async_streaming=False,
         )
 
-        # Other sensors
-        formatted += "Other:\n"
-        formatted += f"  - Battery Voltage: {reading.get('battery_voltage')} V\n"
-        formatted += f"  - Distance: {reading.get('distance')} km\n"
-        formatted += f"  - MIL Status: {reading.get('mil_status')}\n"
-        formatted += f"  - DTC Count: {reading.get('dtc_count')}\n"
+        response = None
+        streamed = False
+        with dspy.context(lm=lm):
+            for item in program(**inputs):
+                if isinstance(item, dspy.streaming.StreamResponse):
+                    streamed = True
+                    yield item.chunk
+                elif isinstance(item, dspy.Prediction):
+                    response = item
+
+        # The listener can miss the field entirely (e.g. after DSPy falls back to
+        # another adapter), so send the final value in one piece instead
+        if not streamed:
+            yield getattr(response, output_field)
+
+        self._response_cache[key] = response
+        return response, False
+
+    def _format_reading(self, reading, current=True):
+        """Format a single OBD reading for LLM"""
+        if not reading:
+            return "No data available"
 
-        return formatted
+        # Readings are plain dicts, so they are memoized by their items
+        return _format_reading_items(tuple(sorted(reading.items())), current)
 
     def _format_readings(self, readings):
         """Format multiple OBD readings for LLM"""
         if not readings:
             return "No data available"
 
-        formatted = f"Vehicle Data ({len(readings)} readings):\n\n"
-
-        # Show latest reading in detail
-        if readings:
-            formatted += "Latest Reading:\n"
-            formatted += self._format_reading(readings[-1])
+        # Only the latest few readings are shown, keeping the prompt bounded
+        latest = readings[-LLM_READINGS_TAIL:]
 
-        return formatted
+        return "\n".join(
+            [
+                "Latest Vehicle Readings (oldest first):",
+                "",
+                *(self._format_reading(reading, current=False) for reading in latest),
+            ]
+        )